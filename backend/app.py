@@ -1,176 +1,321 @@
+import asyncio
+import functools
+import hashlib
+import logging
 import os
-from flask import Flask, request, jsonify, make_response
-from flask_cors import CORS  # Import CORS
-import traceback
-from langchain_openai import ChatOpenAI   # Import GPT-4
+from contextlib import asynccontextmanager
+
+import orjson
+import uvicorn
+from cachetools import TTLCache
+from fastapi import FastAPI, Request, Response
+from fastapi.exceptions import RequestValidationError
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from starlette.datastructures import Headers
 from langchain_core.messages import HumanMessage, SystemMessage
+from pydantic import BaseModel, ConfigDict, Field
 
-from backend.models.workflow import generate
+from backend.models.workflow import generate_batch, stream_generate, http_client, warm_up, state_version
 from backend.models.prompts import get_ui_improvement_prompt  # Import the new function
 from backend.models.prompts import get_ui_description_prompt
 from backend.models.prompts import get_quick_improve_prompt
 
-app = Flask(__name__)
-CORS(app, resources={r"/*": {"origins": "http://localhost:3000"}})
+logger = logging.getLogger(__name__)
 
-smart_llm = ChatOpenAI(
-    model="gpt-4o",
-    temperature=0,
-    max_tokens=4000,
-    timeout=None,
-    max_retries=2,
-    api_key=os.environ.get('OPENAI_API_KEY')
-)
+# identical questions (demos, retries, replays) are answered from memory instead of rerunning the graph
+_result_cache = TTLCache(maxsize=1024, ttl=3600)
+
+# /generate requests arriving within one window are dispatched to the graph together
+BATCH_MAX_SIZE = 8
+BATCH_WINDOW = 0.02
+_generate_queue: asyncio.Queue = asyncio.Queue()
+_running_batches: set[asyncio.Task] = set()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # already done in the gunicorn master when preloaded; otherwise kept off the event loop.
+    # a failure is logged and retried by the first request
+    try:
+        await asyncio.to_thread(warm_up)
+    except Exception:
+        logger.exception("Workflow warm-up failed")
+    batcher = asyncio.create_task(_collect_batches())
+    yield
+    batcher.cancel()
+    await http_client.aclose()
+
+
+MAX_BODY_SIZE = 1024 * 1024
+
+
+class _BodySizeLimitMiddleware:
+    # answer oversized uploads from the header alone, before the body is read and parsed;
+    # plain ASGI, so other responses (the SSE stream included) pass through untouched
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            content_length = Headers(scope=scope).get("content-length", "")
+            if content_length.isdigit() and int(content_length) > MAX_BODY_SIZE:
+                logger.error("Rejected request body of %s bytes", content_length)
+                response = ORJSONResponse({"error": "Payload too large"}, status_code=413)
+                return await response(scope, receive, send)
+        await self.app(scope, receive, send)
+
+
+class _ErrorResponseMiddleware:
+    # unhandled errors become a JSON 500 here, inside CORSMiddleware, so the browser can read them;
+    # Starlette's Exception handlers run outside CORS and re-raise, logging every failure twice
+    def __init__(self, app):
+        self.app = app
 
-fast_llm = ChatOpenAI(
-    model="gpt-4o-mini",
-    temperature=0,
-    max_tokens=4000,
-    timeout=None,
-    max_retries=2,
-    api_key=os.environ.get('ANTROPIC_API_KEY')
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        response_started = False
+
+        async def _send(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        except Exception as exc:
+            if response_started:
+                raise
+            logger.exception("Error in %s", scope["path"])
+            response = ORJSONResponse({"error": f"An error occurred: {str(exc)}"}, status_code=500)
+            await response(scope, receive, send)
+
+
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
+ALLOWED_ORIGINS = os.environ.get("ALLOWED_ORIGINS", "http://localhost:3000").split(",")
+
+# middlewares added later wrap the earlier ones: CORS must come after everything that answers on its own
+app.add_middleware(_ErrorResponseMiddleware)
+app.add_middleware(_BodySizeLimitMiddleware)
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=ALLOWED_ORIGINS,
+    allow_methods=["GET", "POST"],
+    allow_headers=["Content-Type"],
+    max_age=86400,  # let browsers cache the preflight for a day
 )
+# generated TSX compresses well; Starlette leaves text/event-stream responses uncompressed
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
+# langchain_openai is only imported once a model is first needed, keeping app import and worker boot fast
+@functools.cache
+def smart_llm():
+    from langchain_openai import ChatOpenAI   # Import GPT-4
+    return ChatOpenAI(
+        model="gpt-4o",
+        temperature=0,
+        max_tokens=4000,
+        timeout=None,
+        max_retries=2,
+        api_key=os.environ.get('OPENAI_API_KEY'),
+        http_async_client=http_client
+    )
+
+
+@functools.cache
+def fast_llm():
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(
+        model="gpt-4o-mini",
+        temperature=0,
+        max_tokens=4000,
+        timeout=None,
+        max_retries=2,
+        api_key=os.environ.get('ANTROPIC_API_KEY'),
+        http_async_client=http_client
+    )
+
+
+class GenerateRequest(BaseModel):
+    model_config = ConfigDict(extra='forbid')
+
+    question: str = Field(min_length=1, max_length=8192)
+
+
+class QuickImproveRequest(BaseModel):
+    code: str
+    design: str
+    modification: str
 
-@app.route('/generate', methods=['POST'])
-async def generate_ui():
-    app.logger.info("Received request to /generate")
-    data = request.json
-    app.logger.info(f"Received data: {data}")
 
-    if not data or 'question' not in data:
-        return _handle_invalid_request()
+class UpdatePreviewRequest(BaseModel):
+    code: str
 
-    question = data['question']
 
+@app.exception_handler(RequestValidationError)
+async def _handle_invalid_request(request: Request, exc: RequestValidationError):
+    logger.error("Invalid or missing question in request")
+    return ORJSONResponse({"error": "Invalid or missing question in request"}, status_code=400)
+
+
+@app.post('/generate')
+async def generate_ui(req: GenerateRequest):
+    logger.info("Received request to /generate")
+    logger.debug("Received data: %s", req)
+
+    cached = _result_cache.get(_cache_key(req.question, state_version()))
+    if cached is not None:
+        logger.info("Returning cached result")
+        return _result_response(cached, _CACHED_RESULT_SUFFIX)
+
+    result = await _process_question(req.question)
+    # response = await _invoke_llm(str(result), req.question)  # Pass the code to _invoke_llm
+    return _result_response(result)
+
+# only the generated code varies, so the JSON envelope around it is written as constant bytes
+_RESULT_PREFIX = b'{"result":'
+_RESULT_SUFFIX = b'}'
+_CACHED_RESULT_SUFFIX = b',"cached":true}'
+
+def _result_response(result, suffix=_RESULT_SUFFIX):
+    return Response(_RESULT_PREFIX + orjson.dumps(result) + suffix, media_type="application/json")
+
+def _cache_key(question, version):
+    # the graph continues from the shared thread's state, the same question on another state is another answer
+    normalized = " ".join(question.split())
+    return hashlib.blake2b(f"{version}\0{normalized}".encode(), digest_size=16).digest()
+
+@app.post('/generate/stream')
+async def generate_ui_stream(req: GenerateRequest):
+    logger.info("Received request to /generate/stream")
+    return StreamingResponse(_stream_question(req.question), media_type="text/event-stream")
+
+async def _stream_question(question):
     try:
-        result = await _process_question(question)
-        # response = _invoke_llm(str(result), question)  # Pass the code to _invoke_llm
-        return jsonify({"result": result})
+        async for update in stream_generate(question):
+            yield b"data: " + orjson.dumps(update) + b"\n\n"
     except Exception as e:
-        return _handle_exception(e)
-
-def _handle_invalid_request():
-    app.logger.error("Invalid or missing question in request")
-    return jsonify({"error": "Invalid or missing question in request"}), 400
+        logger.exception("Error in generate_ui_stream")
+        yield b"event: error\ndata: " + orjson.dumps({"error": f"An error occurred: {str(e)}"}) + b"\n\n"
 
 async def _process_question(question):
-    result = await generate(question)
-    # return jsonify({"result": result})
-    return result
-
-def _invoke_llm(result, question):  # Change to synchronous function
+    future = asyncio.get_running_loop().create_future()
+    await _generate_queue.put((question, future))
+    return await future
+
+async def _collect_batches():
+    loop = asyncio.get_running_loop()
+    while True:
+        items = [await _generate_queue.get()]
+        deadline = loop.time() + BATCH_WINDOW
+        while len(items) < BATCH_MAX_SIZE:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                items.append(await asyncio.wait_for(_generate_queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        # a batch runs for seconds, keep collecting the next one meanwhile
+        task = asyncio.create_task(_run_batch(items))
+        _running_batches.add(task)
+        task.add_done_callback(_running_batches.discard)
+
+async def _run_batch(items):
+    questions = list(dict.fromkeys(question for question, _ in items))
+    logger.info("Dispatching batch of %d questions (%d requests)", len(questions), len(items))
+    try:
+        # no await in between: the batch starts from exactly this state
+        version = state_version()
+        results = dict(zip(questions, await generate_batch(questions)))
+    except Exception as e:
+        for _, future in items:
+            if not future.done():
+                future.set_exception(e)
+        return
+    for question, result in results.items():
+        if not result.startswith("An error occurred"):
+            _result_cache[_cache_key(question, version)] = result
+    for question, future in items:
+        if not future.done():
+            future.set_result(results[question])
+
+async def _invoke_llm(result, question):
     prompt = get_ui_improvement_prompt(result, question)
-    return fast_llm.invoke([
+    return await fast_llm().ainvoke([
         SystemMessage(content="You are a senior React developer."),
         HumanMessage(content=prompt)
     ])
 
-def _handle_exception(e):
-    app.logger.error(f"Error in generate_ui: {str(e)}")
-    app.logger.error(f"Traceback: {traceback.format_exc()}")
-    return jsonify({"error": f"An error occurred: {str(e)}"}), 500
-
-
 # Add this new route for debugging
-@app.route('/debug', methods=['POST'])
-def debug_request():
-    data = request.json
-    app.logger.info(f"Debug request received: {data}")
-    return jsonify({
+@app.post('/debug')
+async def debug_request(request: Request):
+    data = orjson.loads(await request.body())
+    logger.info("Debug request received: %s", data)
+    # ORJSONResponse skips FastAPI's jsonable_encoder walk, headers go out as [name, value] pairs
+    return ORJSONResponse({
         "received_data": data,
-        "content_type": request.content_type,
-        "headers": dict(request.headers)
+        "content_type": request.headers.get("content-type"),
+        "headers": request.headers.items()
     })
 
 
-@app.route('/health', methods=['GET'])
-def health_check():
-    return jsonify({"status": "healthy"}), 200
+@app.get('/health', status_code=204)
+async def health_check():
+    return Response(status_code=204)
 
 
-@app.route('/update-preview', methods=['POST', 'OPTIONS'])
-def update_preview():
-    if request.method == "OPTIONS":
-        return _build_cors_preflight_response()
-    elif request.method == "POST":
-        code = request.json['code']
-        file_path = os.path.join(os.getcwd(), 'vite-preview-mode', 'my-app', 'src', 'Home', 'GeneratedComponent.tsx')
-
-        try:
-            directory = os.path.dirname(file_path)
-            if not os.path.exists(directory):
-                os.makedirs(directory)
-                app.logger.info(f"Created directory: {directory}")
-
-            with open(file_path, 'w') as file:
-                file.write(code)
-            app.logger.info(f"Successfully wrote to file: {file_path}")
-            return _corsify_actual_response(jsonify({"message": "Code updated successfully"}))
-        except Exception as e:
-            error_message = f"Error updating file: {str(e)}\n{traceback.format_exc()}"
-            app.logger.error(error_message)
-            return _corsify_actual_response(jsonify({"error": error_message}), 500)
-
-def _build_cors_preflight_response():
-    response = make_response()
-    response.headers.add("Access-Control-Allow-Origin", "http://localhost:3000")
-    response.headers.add('Access-Control-Allow-Headers', "Content-Type")
-    response.headers.add('Access-Control-Allow-Methods', "POST, OPTIONS")
-    return response
-
-def _corsify_actual_response(response, status_code=200):
-    response.headers.add("Access-Control-Allow-Origin", "http://localhost:3000")
-    return response, status_code
-
-@app.route('/generate-description', methods=['POST'])
-async def generate_description():
-    app.logger.info("Received request to /generate-description")
-    data = request.json
-    app.logger.info(f"Received data: {data}")
-
-    if not data or 'question' not in data:
-        return _handle_invalid_request()
-
-    question = data['question']
+@app.post('/update-preview')
+async def update_preview(req: UpdatePreviewRequest):
+    file_path = os.path.join(os.getcwd(), 'vite-preview-mode', 'my-app', 'src', 'Home', 'GeneratedComponent.tsx')
 
     try:
-        response = _invoke_llm_for_description(question)
-        return jsonify({"result": response.content})
+        directory = os.path.dirname(file_path)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+            logger.info("Created directory: %s", directory)
+
+        with open(file_path, 'w') as file:
+            file.write(req.code)
+        logger.info("Successfully wrote to file: %s", file_path)
+        return {"message": "Code updated successfully"}
     except Exception as e:
-        return _handle_exception(e)
+        logger.exception("Error updating file")
+        return ORJSONResponse({"error": f"Error updating file: {str(e)}"}, status_code=500)
+
+@app.post('/generate-description')
+async def generate_description(req: GenerateRequest):
+    logger.info("Received request to /generate-description")
+    logger.debug("Received data: %s", req)
 
-def _invoke_llm_for_description(question):
+    response = await _invoke_llm_for_description(req.question)
+    return {"result": response.content}
+
+async def _invoke_llm_for_description(question):
     prompt = get_ui_description_prompt(question)
-    return fast_llm.invoke([
+    return await fast_llm().ainvoke([
         SystemMessage(content="You are a UI/UX expert specializing in creating detailed interface descriptions. Your description will be used to generate react code with nlmk components."),
         HumanMessage(content=prompt)
     ])
 
-@app.route('/quick-improve', methods=['POST'])
-async def quick_improve():
-    app.logger.info("Received request to /quick-improve")
-    data = request.json
-    app.logger.info(f"Received data: {data}")
-
-    if not data or 'code' not in data or 'design' not in data or 'modification' not in data:
-        return _handle_invalid_request()
-
-    code = data['code']
-    design = data['design']
-    modification = data['modification']
+@app.post('/quick-improve')
+async def quick_improve(req: QuickImproveRequest):
+    logger.info("Received request to /quick-improve")
+    logger.debug("Received data: %s", req)
 
-    try:
-        response = _invoke_llm_for_quick_improve(code, design, modification)
-        return jsonify({"result": response.content})
-    except Exception as e:
-        return _handle_exception(e)
+    response = await _invoke_llm_for_quick_improve(req.code, req.design, req.modification)
+    return {"result": response.content}
 
-def _invoke_llm_for_quick_improve(code, design, modification):
+async def _invoke_llm_for_quick_improve(code, design, modification):
     prompt = get_quick_improve_prompt(code, design, modification)
-    return fast_llm.invoke([
+    return await fast_llm().ainvoke([
         SystemMessage(content="You are a senior React developer specializing in improving and optimizing React code."),
         HumanMessage(content=prompt)
     ])
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    uvicorn.run(app, port=5000)
@@ -0,0 +1,20 @@
+import os
+
+bind = os.environ.get("BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("WEB_CONCURRENCY", 2 * (os.cpu_count() or 1) + 1))
+# uvicorn[standard] picks uvloop and httptools automatically when they are installed
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = 300
+# import the app once in the master; when_ready then builds the workflow there, so the FAISS index,
+# prompts and compiled graph are shared with workers via copy-on-write and npm install runs only once
+preload_app = True
+
+
+def when_ready(server):
+    # runs in the master before the workers are forked
+    from backend.models.workflow import warm_up
+
+    try:
+        warm_up()
+    except Exception:
+        server.log.exception("Workflow warm-up failed, workers will retry on their own")
@@ -1,5 +1,7 @@
 from langchain_core.prompts import ChatPromptTemplate
 
+from backend.parsers.recursive import get_comps_descs
+
 FUNNEL = ChatPromptTemplate.from_messages(
     [
         (
@@ -242,7 +244,26 @@ QUERY_GENERATOR = ChatPromptTemplate.from_messages(
 
 
 def get_ui_improvement_prompt(result, question):
-    return f"""
+    return "".join((_IMPROVE_HEAD, result, _IMPROVE_MIDDLE, question, _IMPROVE_TAIL))
+
+
+def get_ui_description_prompt(question):
+    return "".join((_DESCRIPTION_HEAD, question, _DESCRIPTION_TAIL))
+
+
+def get_quick_improve_prompt(code, design, modification):
+    return "".join((_QUICK_IMPROVE_HEAD, code, _QUICK_IMPROVE_DESIGN, design,
+                    _QUICK_IMPROVE_MODIFICATION, modification, _QUICK_IMPROVE_TAIL))
+
+
+example_output = """
+Design a web page with Sidebar on the left and Header at the top, then add a horizontal Divider, followed by a Tabs component, and under the Tabs, display a grid of Cards with images and descriptions.
+"""
+
+component_description = get_comps_descs()
+
+# Static parts of the prompts above, glued around the dynamic values with str.join
+_IMPROVE_HEAD = """
     Given a code, check if it follows the provided design, use only provided components, don't change any imports.
     Make sure the UI follows the provided design.
     Return only code in js format and nothing else. (no ```, no comments, no markdown, no nothing).
@@ -251,8 +272,8 @@ def get_ui_improvement_prompt(result, question):
     index.js structure:
 
     ```
-    import React, {{ StrictMode }} from "react";
-    import {{ createRoot }} from "react-dom/client";
+    import React, { StrictMode } from "react";
+    import { createRoot } from "react-dom/client";
     import "./styles.css";
     import App from "./App";
     const root = createRoot(document.getElementById("root"));
@@ -263,17 +284,18 @@ def get_ui_improvement_prompt(result, question):
     );
 
     Code to improve:
-    {result}    
+    """
+_IMPROVE_MIDDLE = """    
     Design:
-    {question}
+    """
+_IMPROVE_TAIL = """
 
     all text in the code must be in russian.
     """
 
-
-def get_ui_description_prompt(question):
-    return f"""
-    Generate a detailed description for a user interface based on the following input: {question}
+_DESCRIPTION_HEAD = """
+    Generate a detailed description for a user interface based on the following input: """
+_DESCRIPTION_TAIL = f"""
     referetence components onky by the name, dont include their description.
     Use components from the @nlmk/ds-2.0 library, component names and descriptions below:
     {component_description}
@@ -282,19 +304,20 @@ def get_ui_description_prompt(question):
     {example_output}
     """
 
-
-def get_quick_improve_prompt(code, design, modification):
-    return f"""
+_QUICK_IMPROVE_HEAD = """
 Given the following React code, design description, and modification request:
 
 Code:
-{code}
+"""
+_QUICK_IMPROVE_DESIGN = """
 
 Design Description:
-{design}
+"""
+_QUICK_IMPROVE_MODIFICATION = """
 
 Modification Request:
-{modification}
+"""
+_QUICK_IMPROVE_TAIL = """
 
 
 
@@ -309,61 +332,6 @@ Please make the following improvements to the code:
 return only code and nothing else, no markdown, no ```, no comments, no nothing
 """
 
-
-example_output = """
-Design a web page with Sidebar on the left and Header at the top, then add a horizontal Divider, followed by a Tabs component, and under the Tabs, display a grid of Cards with images and descriptions.
-"""
-
-component_description = """
-{
-    "descriptions": {
-        "Accordion": "{`Компонент \"аккордеон\" предоставляет большие объемы контента в ограниченном пространстве с помощью пошагового раскрытия. Заголовок обеспечивает пользователю общий обзор содержимого, позволяя решить, какие разделы читать.\n\n        Аккордеоны могут сделать обработку информации и поиск более эффективными. Однако они скрывают контент от пользователей, и важно учесть, что пользователь может не заметить или не прочитать весь включенный контент. Если пользователь, вероятно, должен прочесть весь контент, не используйте аккордеон, так как это добавляет дополнительный клик; вместо этого используйте плноценную прокручиваемую страницу с обычными заголовками.`}",
-        "Alert": "\"Компонент Alert представляет собой компонент уведомления или предупреждения. Он используется для отображения важных сообщений пользователю с цветовой кодировкой в зависимости от уровня серьёзности ситуации. Поддерживает несколько вариантов отображения: стандарный, заполненный и с обведённым контуром.\"",
-        "AttachFiles": "\"Компонент, используемый для прикрепления файла. Компонент AttachFiles\n          собирается из необходимого количества компонентов File.\"",
-        "Avatar": "{`Компонент Avatar представляет собой пользовательский компонент, который отображает аватар пользователя. Этот аватар может быть изображением, инициалами пользователя, иконкой профиля, а также может включать индикаторы онлайн-статуса, числовой индикатор или иконку в виде значка (badge). Компонент также поддерживает различные размеры и формы для кастомизации внешнего вида аватара.`}",
-        "Badge": "\"Компонент Badge используется для отображения меток (badges), таких как лейблы, тэги, статусы и т.д. Обычно Badge используют внутри или в непосредственной близости от другого более крупного компонента интерфейса.\"",
-        "Box": "\"Компонент Box представляет собой универсальный контейнер, используемый для стилизации и компоновки содержимого. Он обладает пропсами для управления стилями, включая background, padding, border, borderRadius и flexbox свойствами, такими как display, flexDirection, justifyContent, alignItems, flexWrap и gap. Это делает Box инструментом для создания структурированного и адаптивного интерфейса.\"",
-        "Breadcrumbs": "\"Компонент BreadCrumbs (хлебные крошки) используется в пользовательском интерфейсе для предоставления визуальной навигационной структуры, позволяющей пользователям быстро и эффективно понимать своё местоположение в иерархии контента или приложения. BreadCrumbs представляют собой последовательность ссылок или текста, а каждый элемент в ней указывает на уровень иерархии, переходя от более общего к более специфическому контенту.\"",
-        "Button": "\"Компонент Button представляет собой кнопку, которую можно настроить с помощью различных параметров, таких как\n          размер, иконки, знаки и стили.\"",
-        "Card": "\"Компонент Card является функциональным компонентом, который предназначен для отображения карточки с различными элементами интерфейса, такими как изображение, заголовок, описание, значки, селектор и группа кнопок.\"",
-        "Checkbox": "\"Компонент Checkbox является элементом пользовательского интерфейса, который позволяет пользователю взаимодействовать с формой, выбирая или снимая выбор с определённых опций. \"",
-        "Chip": "\"Компонент Chip обычно используется для отображения небольших интерактивных элементов пользовательского интерфейса, таких как теги, метки, категории или выборы в фильтрах, а также для представления небольших блоков информации.\"",
-        "DatePicker": "\"Компонент для выбора даты и времени, с возможностью ограничения времени, выбором периода времени и опциональным сдвигом.\"",
-        "Divider": "\"Компонент Divider - это визуальный элемент, используемый для разделения содержимого на разных частях пользовательского интерфейса, таких как списки, сетки или разделы на странице.\"",
-        "DragAndDrop": "\"Компонент DragAndDrop представляет собой компонент ...\"",
-        "Drawer": "\"Компонент Drawer обеспечивает отображение выдвижной панели с возможностью настройки позиции и обработки закрытия.\"",
-        "Dropdown": "\"Dropdown позволяет пользователям выбирать одно действие из выпадающего меню\"",
-        "ErrorPage": "\"Компонент ErrorPage предназначен для информирования пользователя о различных ошибках веб-приложения и предложения возможных действий для их решения с помощью настраиваемых сообщений и изображений.\"",
-        "Grid": "\"Компонент Grid представляет собой универс��льный контейнер, используемый для позиционирования внутренних компонентов/элементов: горизонтальный или вертикальный. Он обладает различными пропсами, что делает Grid инструментом для создания структурированного и адаптивного интерфейса.\"",
-        "Header": "\"Header - это компонент, который отображает настраиваемый верхний колонтитул (шапку) веб-страницы или приложения.\"",
-        "Icon": "\"Компонент иконок, который можно использовать как самостоятельно, так и внутри других компонентов\"",
-        "ImagePicture": "\"ImagePicture обеспечивает гибкую отрисовку изображений с различными соотношениями сторон и радиусами границ. Поддерживает функцию зума при наведении.\"",
-        "Input": "\"Компонент Input позволяет пользователям вводить текстовую информацию. Он поддерживает различные варианты, включая лейблы, иконки, многострочный ввод и различные стили.\"",
-        "InputRange": "\"Компонент InputRange отражает диапазон значений вдоль полосы, из которой пользователи могут выбрать диапазон\n        значений. Компонент подходит для настройки таких параметров, как громкость, яркость или применение фильтров\n        изображения.\"",
-        "InputSlider": "\"InputSlider представляет собой слайдер для ввода числовых значений, который позволяет пользователю выбирать значение в заданном диапазоне.\"",
-        "Link": "\"Link компонент позволяет пользователям переходить по заданным ссылкам. Он пддерживает иконки, разные размеры и состояния, такие как disabled.\"",
-        "Modal": "\"Компонент Modal обеспечивает отображение модальных окон с возможностями перетаскивания, изменения размера и обработки закрытия.\"",
-        "ProgressBar": "\"ProgressBar представляет собой компонент, показывающий прогресс выполнения задачи или процесса. Он предоставляет наглядное представление о проценте выполнения.\"",
-        "PseudoInput": "\"PseudoInput - элемент, который позволяет отображать информацию.\"",
-        "Radio": "\"Компонент Radio обычно используется для выбора одного из нескольких взаимоисключающих вариантов в рамках определённой группы.\"",
-        "SegmentButtonGroup": "\"Компонент SegmentButtonGroup - это набор кнопок, из которых пользователь может выбрать только одну.\"",
-        "Sidebar": "{`Компонент для навигации и организации контента в интерфейсе.`}",
-        "SimpleSelect": "\"SimpleSelect позволяет пользователям выбирать один элемент из списка. Он поддерживает различные настройки и стили.\"",
-        "SkeletonLoader": "\"Skeleton Loader — это статический/анимированный элемент для информации, которая все еще загружается.\"",
-        "SlideToggle": "\"SlideToggle — элемент, который позволяет отображать/скрывать элемент.\"",
-        "Snackbar": "\"Snackbar - это компонент, который предоставляет краткое уведомление или сообщение о событии.\"",
-        "Spinner": "\"Spinner — это компонент который используется в качестве индикатора загрузки.\"",
-        "Stepper": "{\n          'Компонент Stepper представляет из себя пользовательный компонент, который отображает текущий Step (с помощью компонента Badge), его название и линию - Divider. По нему можно кликнуть и получить его состояние и индекс.'\n        }",
-        "Switch": "\"Switch - это компонент, который реализует функциональность переключателя, часто используемого в пользовательских интерфейсах для настройки параметров, таких как включение/выключение определенных функций приложения.\"",
-        "Tabs": "\"Компонент Tabs, который объединил в себя Tab элементы. Компонент использует подход compound pattern.\"",
-        "TimePicker": "\"TimePicker позволяет пользователям выбирать время или период времени. Поддерживает различные форматы и диапазоны времени.\"",
-        "ToggleButtonGroup": "\"Компонент ToggleButtonGroup - это набор кнопок, из которых пользователь может выбрать только одну.\"",
-        "Tooltip": "\"Компонент-подсказка, появляющийся при определенном взаимодействии с дочерним элементом компонента (по умолчанию: при наведении курсора). Tooltip рассчитан не только на работу с простой информацией (текст) с единой стилизацией, но и на визуализацию подсказок, содержащих нестандартную информацию (списки, картинки, таблицы).\"",
-        "Typography": "{`Компонент для стандартизации текста и относящимся к нему свойствам стилизации.`}"
-    }
-}
-"""
-
 test_prompt = """
 
 package.json:
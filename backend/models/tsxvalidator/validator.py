@@ -1,8 +1,10 @@
 import logging
+import queue
 import re
 import subprocess
 import os
 import json
+import threading
 import uuid
 import shutil
 import sys
@@ -21,28 +23,79 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# tsc --watch печатает эту строку после каждого цикла компиляции
+WATCH_SENTINEL = "Watching for file changes"
+# в конец файла для watcher'а дописывается `__tsx_check_<id>;`: ошибка TS2304 с этим именем подтверждает,
+# что цикл скомпилировал именно текущую проверку. При синтаксических ошибках tsc семантику не проверяет
+# и маркера не будет, но тогда в выводе есть ошибки самого файла
+CHECK_MARKER = "__tsx_check_"
+# по умолчанию окружение лежит в корне репозитория (как при запуске `python3 -m backend.app`), независимо от cwd
+DEFAULT_BASE_DIR = Path(__file__).resolve().parents[3] / "tsx_validator_env"
+# node/npm/tsc получают только эти переменные, а не всё окружение веб-сервера
+_ENV_KEYS = (
+    "PATH", "HOME", "USERPROFILE", "APPDATA", "LOCALAPPDATA", "SYSTEMROOT", "COMSPEC", "PATHEXT",
+    "TEMP", "TMP", "TMPDIR", "LANG", "LC_ALL", "HTTP_PROXY", "HTTPS_PROXY", "NO_PROXY",
+)
+_ENV_PREFIXES = ("NODE_", "NPM_", "npm_config_")
+# src/temp_x.tsx(12,5): error TS2322: Type ... — одна строка вывода tsc на одну ошибку
+_ERROR_RE = re.compile(r'^(src/[^(\n]+)\((\d+),(\d+)\): error TS(\d+):[ \t]*(.*?)\s*$', re.MULTILINE)
+# compilerOptions из tsconfig.json для разового запуска по одному файлу: с файлом в командной строке tsc конфиг не читает.
+# paths через командную строку не задать, сгенерированный код импортирует компоненты напрямую из @nlmk/ds-2.0
+SINGLE_FILE_OPTIONS = [
+    "--noEmit",
+    "--incremental",
+    "--target", "es2015",
+    "--module", "esnext",
+    "--moduleResolution", "node",
+    "--jsx", "react-jsx",
+    "--strict",
+    "--allowJs",
+    "--esModuleInterop",
+    "--allowSyntheticDefaultImports",
+    "--forceConsistentCasingInFileNames",
+    "--noFallthroughCasesInSwitch",
+    "--resolveJsonModule",
+    "--isolatedModules",
+]
+
 
 class TSXValidator:
-    def __init__(self, base_dir: str = "./tsx_validator_env"):
+    def __init__(self, base_dir: str | Path = DEFAULT_BASE_DIR, use_watch: bool = True, watch_timeout: float = 120):
         self.base_dir = Path(base_dir).resolve()
+        self._env = {
+            key: value for key, value in os.environ.items()
+            if key.upper() in _ENV_KEYS or key.startswith(_ENV_PREFIXES)
+        }
+        self._env['PATH'] = f"{self.base_dir / 'node_modules' / '.bin'}{os.pathsep}{self._env.get('PATH', '')}"
+        # Node >= 22.1 кэширует скомпилированный V8 код tsc.js между запусками, старые версии переменную игнорируют
+        self._env.setdefault('NODE_COMPILE_CACHE', str(self.base_dir / 'node_modules' / '.cache' / 'node'))
         self.npm_path = shutil.which("npm") or "npm"
         self.use_shell = sys.platform.startswith("win")
+        self.use_watch = use_watch
+        self.watch_timeout = watch_timeout
+        self._tsc_proc: Optional[subprocess.Popen] = None
+        self._tsc_output: Optional[queue.Queue] = None
+        self._lock = threading.Lock()
         self.tsc_path: Optional[str] = self._check_typescript()
-        if not self.base_dir.is_dir():
-            self.setup_environment()
+        # конфиги сверяются при каждом запуске: уже существующее окружение тоже получает актуальный tsconfig.json
+        self.setup_environment()
 
     def setup_environment(self):
         logger.info(f"Настройка окружения в {self.base_dir}")
         self.base_dir.mkdir(parents=True, exist_ok=True)
-        self._create_package_json()
+        package_changed = self._create_package_json()
         self._create_tsconfig()
-        self._install_dependencies()
+        # npm install нужен только для нового окружения или изменившихся зависимостей
+        if package_changed or not (self.base_dir / "node_modules").is_dir():
+            self._install_dependencies()
         (self.base_dir / "src").mkdir(exist_ok=True)
+        # сюда tsc складывает .tsbuildinfo, чтобы следующие проверки не типизировали React и ds-2.0 заново
+        (self.base_dir / "node_modules" / ".cache" / "tsc").mkdir(parents=True, exist_ok=True)
         self.tsc_path = self._check_typescript()
         if not self.tsc_path:
             raise RuntimeError("TypeScript не установлен или не найден")
 
-    def _create_package_json(self):
+    def _create_package_json(self) -> bool:
         package_json = {
             "name": "tsx-validator",
             "version": "1.0.0",
@@ -60,15 +113,18 @@ class TSXValidator:
             }
         }
         package_json_path = self.base_dir / "package.json"
-        with open(package_json_path, "w") as f:
-            json.dump(package_json, f, indent=2)
-        logger.info(f"Создан файл package.json: {package_json_path}")
+        if self._write_json_if_changed(package_json_path, package_json):
+            logger.info(f"Создан файл package.json: {package_json_path}")
+            return True
+        return False
 
-    def _create_tsconfig(self):
-        tsconfig = {
+    @staticmethod
+    def _tsconfig() -> Dict[str, Any]:
+        return {
           "compilerOptions": {
             "noEmit": True,
             "incremental": True,
+            "tsBuildInfoFile": "./node_modules/.cache/tsc/tsx_validator.tsbuildinfo",
             "extendedDiagnostics": True,
             "target": "es2015",
             "module": "esnext",
@@ -95,10 +151,24 @@ class TSXValidator:
             "node_modules"
           ]
         }
+
+    def _create_tsconfig(self):
         tsconfig_path = self.base_dir / "tsconfig.json"
-        with open(tsconfig_path, "w") as f:
-            json.dump(tsconfig, f, indent=2)
-        logger.info(f"Создан файл tsconfig.json: {tsconfig_path}")
+        if self._write_json_if_changed(tsconfig_path, self._tsconfig()):
+            logger.info(f"Создан файл tsconfig.json: {tsconfig_path}")
+
+    @staticmethod
+    def _write_json_if_changed(path: Path, data: Dict[str, Any]) -> bool:
+        """Не трогает файл с тем же содержимым: новый mtime tsconfig.json сбрасывает инкрементальный кэш tsc"""
+        content = json.dumps(data, indent=2).encode()
+        try:
+            if path.read_bytes() == content:
+                logger.info(f"Файл не изменился: {path}")
+                return False
+        except FileNotFoundError:
+            pass
+        path.write_bytes(content)
+        return True
 
     def _install_dependencies(self):
         logger.info("Начало установки зависимостей")
@@ -131,10 +201,7 @@ class TSXValidator:
                 return None
 
     def _run_command(self, cmd: List[str]) -> subprocess.CompletedProcess:
-        logger.info(f"Preparing env")
-        env = os.environ.copy()
-        env['PATH'] = f"{self.base_dir / 'node_modules' / '.bin'}{os.pathsep}{env.get('PATH', '')}"
-        logger.info(f"Running command: {' '.join(cmd)}")
+        logger.info("Running command: %s", cmd)
         return subprocess.run(
             cmd,
             shell=self.use_shell,
@@ -142,46 +209,189 @@ class TSXValidator:
             capture_output=True,
             text=True,
             check=False,
-            env=env
+            env=self._env
         )
 
+    def _start_watcher(self) -> bool:
+        """Поднимает долгоживущий tsc --watch, чтобы не платить за старт Node и сборку программы на каждой проверке"""
+        if not self.use_watch or not self.tsc_path:
+            return False
+        if self._tsc_proc and self._tsc_proc.poll() is None:
+            return True
+
+        # у каждого процесса (воркера gunicorn) свой файл и свой конфиг: чужие проверки не запускают наш цикл.
+        # Файл перезаписывается на каждой проверке, так что одна проверка — один цикл компиляции
+        check_file, watch_config = self._watch_paths()
+        cmd = [
+            self.tsc_path,
+            "--watch",
+            "--preserveWatchOutput",
+            "--pretty", "false",
+            "--project", str(watch_config)
+        ]
+        logger.info(f"Starting watcher: {' '.join(cmd)}")
+        try:
+            check_file.touch()
+            watch_tsconfig = self._tsconfig()
+            # программа живёт в памяти watcher'а: .tsbuildinfo ему не нужен (incremental: false вместе
+            # с tsBuildInfoFile — ошибка TS5069), а extendedDiagnostics засоряет вывод каждого цикла
+            for option in ("incremental", "tsBuildInfoFile", "extendedDiagnostics"):
+                del watch_tsconfig["compilerOptions"][option]
+            watch_tsconfig["include"] = [check_file.relative_to(self.base_dir).as_posix()]
+            self._write_json_if_changed(watch_config, watch_tsconfig)
+            self._tsc_proc = subprocess.Popen(
+                cmd,
+                shell=self.use_shell,
+                cwd=str(self.base_dir),
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True,
+                encoding='utf-8',
+                env=self._env
+            )
+            self._tsc_output = queue.Queue()
+            threading.Thread(
+                target=self._pump_output, args=(self._tsc_proc, self._tsc_output), daemon=True
+            ).start()
+            # первый цикл компиляции стартует сам по себе, дожидаемся его
+            self._read_watch_cycle()
+            return True
+        except Exception:
+            logger.exception("Не удалось запустить tsc --watch, используем разовый запуск tsc")
+            self.close()
+            self.use_watch = False
+            return False
+
+    @staticmethod
+    def _pump_output(proc: subprocess.Popen, output: queue.Queue):
+        for line in proc.stdout:
+            output.put(line)
+        output.put(None)
+
+    def _read_watch_cycle(self) -> str:
+        lines = []
+        while True:
+            line = self._tsc_output.get(timeout=self.watch_timeout)
+            if line is None:
+                raise RuntimeError("tsc --watch завершился")
+            if WATCH_SENTINEL in line:
+                return "".join(lines)
+            lines.append(line)
+
+    def _drain_watch_output(self):
+        try:
+            while True:
+                self._tsc_output.get_nowait()
+        except queue.Empty:
+            pass
+
+    def _watch_paths(self) -> tuple[Path, Path]:
+        pid = os.getpid()
+        return self.base_dir / "src" / f"check_w{pid}.tsx", self.base_dir / f"tsconfig.w{pid}.json"
+
+    def _stop_watcher(self):
+        if self._tsc_proc and self._tsc_proc.poll() is None:
+            self._tsc_proc.terminate()
+        self._tsc_proc = None
+
+    def _single_build_info(self, thread_id: int | str) -> Path:
+        return self.base_dir / "node_modules" / ".cache" / "tsc" / "single" / f"{os.getpid()}-{thread_id}.tsbuildinfo"
+
+    def close(self):
+        self._stop_watcher()
+        pattern = self._single_build_info("*")
+        for build_info in pattern.parent.glob(pattern.name):
+            build_info.unlink(missing_ok=True)
+        for path in self._watch_paths():
+            path.unlink(missing_ok=True)
+
+    def __del__(self):
+        self.close()
+
+    def _run_tsc(self, temp_file: Path) -> str:
+        # только проверяемый файл: без поиска src/temp_*.tsx по проекту и без ошибок параллельных проверок
+        cmd = [
+            self.tsc_path,
+            *SINGLE_FILE_OPTIONS,
+            # разовые запуски идут параллельно: у каждого потока свой .tsbuildinfo, tsc пишет его не атомарно
+            "--tsBuildInfoFile", str(self._single_build_info(threading.get_ident())),
+            temp_file.relative_to(self.base_dir).as_posix()
+        ]
+
+        result = self._run_command(cmd)
+        logger.info("Return code: %s", result.returncode)
+        logger.debug("Command output: %s", result.stdout)
+        logger.debug("Command errors: %s", result.stderr)
+        return result.stderr or result.stdout
+
+    def _compile(self, temp_file: Path, marker: Optional[str]) -> str:
+        if marker:
+            try:
+                output = self._read_check_cycle(temp_file.relative_to(self.base_dir).as_posix(), marker)
+                logger.debug("Watcher output: %s", output)
+                return output
+            except Exception:
+                logger.exception("tsc --watch не ответил, переключаемся на разовый запуск tsc")
+                self._stop_watcher()
+                self.use_watch = False
+        return self._run_tsc(temp_file)
+
+    def _read_check_cycle(self, file_path: str, marker: str) -> str:
+        # циклы, запущенные не нашей записью (повторное событие файловой системы, конец прошлой проверки),
+        # пропускаем: в них либо чужой маркер, либо нет ни маркера, ни ошибок файла
+        while True:
+            output = self._read_watch_cycle()
+            if marker in output:
+                return output
+            if CHECK_MARKER not in output and f"{file_path}(" in output:
+                return output
+            logger.debug("Пропущен цикл tsc --watch без текущей проверки: %s", output)
+
     def validate_tsx(self, tsx_code: str) -> Dict[str, Any]:
         logger.info("Starting TSX code validation")
-        temp_file = self.base_dir / "src" / f"temp_{1}.tsx"
+        # у процесса один watcher и один файл, поэтому проверки через него идут по одной; разовые запуски tsc — параллельно
+        with self._lock:
+            if self._start_watcher():
+                self._drain_watch_output()
+                return self._validate(tsx_code, watching=True)
+        return self._validate(tsx_code, watching=False)
+
+    def _validate(self, tsx_code: str, watching: bool) -> Dict[str, Any]:
+        marker = f"{CHECK_MARKER}{uuid.uuid4().hex}" if watching else None
+        temp_file = self._watch_paths()[0] if watching else self.base_dir / "src" / f"temp_{uuid.uuid4().hex}.tsx"
 
         try:
-            with open(temp_file, "w", encoding='utf-8') as f:
-                f.write(tsx_code)
-            logger.info(f"Temporary file created: {temp_file}")
+            if watching:
+                # маркер отдельной строкой в конце не сдвигает позиции ошибок в самом коде;
+                # запись через os.replace: watcher не прочитает наполовину записанный файл
+                staged = temp_file.with_suffix(".tmp")
+                staged.write_text(f"{tsx_code}\n{marker};\n", encoding='utf-8')
+                os.replace(staged, temp_file)
+            else:
+                with open(temp_file, "w", encoding='utf-8') as f:
+                    f.write(tsx_code)
+            logger.debug("Temporary file created: %s", temp_file)
 
             if not self.tsc_path:
                 raise RuntimeError("TypeScript compiler not found")
 
-            cmd = [
-                self.tsc_path,
-                "--project", str(self.base_dir / "tsconfig.json")
-            ]
-
-            logger.info(f"Executing command: {' '.join(cmd)}...")
-            result = self._run_command(cmd)
-            logger.info(f"command executed.")
-
-            logger.info(f"Command output: {result.stdout}")
-            logger.info(f"Command errors: {result.stderr}")
-            logger.info(f"Return code: {result.returncode}")
-
-            parsed_errors = self._parse_errors(result.stderr or result.stdout)
+            parsed_errors = self._parse_errors(
+                self._compile(temp_file, marker), temp_file.relative_to(self.base_dir).as_posix()
+            )
             if not parsed_errors:
                 logger.info("TSX code validation successful")
                 return {"valid": True, "errors": []}
             else:
-                logger.info(f"Errors found during TSX code validation: {parsed_errors}")
+                logger.info("Errors found during TSX code validation: %d", len(parsed_errors))
+                logger.debug("Errors: %s", parsed_errors)
                 return {"valid": False, "errors": parsed_errors}
         except Exception as e:
             logger.exception("Unexpected error during validation")
             return {"valid": False, "errors": [str(e)]}
         finally:
-            self._clean_up(temp_file)
+            # файл watcher'а остаётся до следующей проверки: его удаление стоило бы лишнего цикла компиляции
+            if not watching:
+                self._clean_up(temp_file)
 
     def _log_file_contents(self, file_path: Path):
         try:
@@ -191,50 +401,32 @@ class TSXValidator:
         except Exception as e:
             logger.error(f"Ошибка при чтении файла {file_path}: {str(e)}")
 
-    def _parse_errors(self, error_output: str) -> List[Dict[str, str]]:
+    def _parse_errors(self, error_output: str, file_path: Optional[str] = None) -> List[Dict[str, Any]]:
         logger.info("Парсинг ошибок компиляции")
-        lines = error_output.split('\n')
-        parsed_errors = []
-
-        for line in lines:
-            if 'error TS' in line and line.startswith('src/'):
-                logger.debug(f"Обработка строки ошибки: {line}")
-                error = self._parse_error_line(line)
-                if error:
-                    parsed_errors.append(error)
-            else:
-                logger.debug(f"Игнорирована строка: {line}")
+        if 'error TS' not in error_output:
+            # чистая сборка: нечего разбирать регуляркой
+            logger.info("Всего найдено ошибок в src: 0")
+            return []
+        # в выводе могут быть и другие файлы, поэтому оставляем только ошибки своего (путь от base_dir)
+        parsed_errors = [
+            {
+                "location": [int(line), int(column)],
+                "code": f"TS{code}",
+                "message": message
+            }
+            for path, line, column, code, message in _ERROR_RE.findall(error_output)
+            if (file_path is None or path == file_path) and CHECK_MARKER not in message
+        ]
 
-        logger.info(f"Всего найдено ошибок в src: {len(parsed_errors)}")
+        logger.info("Всего найдено ошибок в src: %d", len(parsed_errors))
         return parsed_errors
 
-    def _parse_error_line(self, line: str) -> Optional[Dict[str, str]]:
-        try:
-            parts = line.split(': error TS', 1)
-            if len(parts) == 2:
-                location = parts[0]
-                error_parts = parts[1].split(':', 1)
-                if len(error_parts) == 2:
-                    error_code = error_parts[0]
-                    message = error_parts[1].strip()
-                    location = re.search(r'\((\d+),(\d+)\)$', location).groups()
-                    return {
-                        "location": list(map(int, location)),
-                        "code": f"TS{error_code}",
-                        "message": message
-                    }
-            logger.warning(f"Неожиданный формат ошибки: {line}")
-            return None
-        except Exception as e:
-            logger.error(f"Ошибка при парсинге строки ошибки: {str(e)}")
-            return None
-
     def _clean_up(self, temp_file: Path):
         pass
         try:
             if temp_file.exists():
                 temp_file.unlink()
-                logger.debug(f"Временный файл удален: {temp_file}")
+                logger.debug("Временный файл удален: %s", temp_file)
             else:
                 logger.warning(f"Временный файл не найден для удаления: {temp_file}")
         except Exception as e:
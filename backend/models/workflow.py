@@ -1,57 +1,213 @@
 import asyncio
+import functools
+import hashlib
 import logging
 import os
 import re
-from typing import Dict, Any, Union, List, Tuple
-
-from langchain_community.vectorstores import FAISS
-from langchain_core.output_parsers import PydanticOutputParser, StrOutputParser, CommaSeparatedListOutputParser
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, fields
+from typing import Dict, Any, Union, List, Tuple, AsyncIterator, Iterable
+
+import diskcache
+import httpx
+import numpy as np
+from cachetools import TTLCache
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.output_parsers import StrOutputParser, CommaSeparatedListOutputParser
 from langchain_core.runnables import chain
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from langgraph.checkpoint.memory import MemorySaver
 from langgraph.constants import END
-from langgraph.graph import StateGraph
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, TypeAdapter
 from dotenv import load_dotenv
 
 from backend.models.prompts import code_sample, FUNNEL, CODER, DEBUGGER, FUNNEL_ITER, CODER_ITER, QUERY_GENERATOR
 from backend.models.tsxvalidator.validator import TSXValidator
-from backend.parsers.recursive import get_comps_descs, parse_recursivly_store_faiss
+from backend.parsers.recursive import get_comps_descs, load_comps_descs, parse_recursivly_store_faiss
+
+_CAMEL_RE = re.compile(r'\W([A-Z]{2}[a-z]+)')
+_FENCE_RE = re.compile(r"```(jsx|tsx)\s*|\s*```")
+_WORD_RE = re.compile(r'\w+')
 
 load_dotenv()
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 FAISS_DB_PATH = os.path.join(BASE_DIR, "../parsers", "data", "faiss_extended")
+DOCS_CACHE_PATH = os.path.join(BASE_DIR, "..", ".docs_cache")
+DOCS_CACHE_TTL = 24 * 3600
+EMBEDDINGS_CACHE_PATH = os.path.join(BASE_DIR, "..", ".embeddings_cache")
+THREAD_TTL = 3600
+MAX_THREADS = 1000
+# concurrent graph runs share one OpenAI quota, cap the LLM calls in flight
+LLM_CONCURRENCY = int(os.environ.get("LLM_CONCURRENCY", 16))
+_llm_slots = asyncio.Semaphore(LLM_CONCURRENCY)
+# compile checks block on tsc (one at a time through the watcher), they get their own threads
+# instead of the default pool that the docs search hops onto
+TSC_CONCURRENCY = int(os.environ.get("TSC_CONCURRENCY", os.cpu_count() or 1))
+_tsc_pool = ThreadPoolExecutor(max_workers=TSC_CONCURRENCY, thread_name_prefix="tsc")
+# MMR parameters of the component docs search, debug lookups take the single nearest doc
+MMR_K, MMR_FETCH_K, MMR_LAMBDA = 3, 30, 0.42
+# the flat index holds a few hundred vectors: an OpenMP team per search costs more than the scan itself
+FAISS_THREADS = int(os.environ.get("FAISS_THREADS", 1))
 openai_api_key = os.environ.get('OPENAI_API_KEY')
-try:
-    if not openai_api_key:
-        raise ValueError("OPENAI_API_KEY not found in environment variables")
-    llm = ChatOpenAI(temperature=0.0, api_key=openai_api_key, model="gpt-4o-mini")
-    embeddings = OpenAIEmbeddings(api_key=openai_api_key)
-    parse_recursivly_store_faiss()
-
-    validator = TSXValidator()
-    db = FAISS.load_local(
-        FAISS_DB_PATH, embeddings, allow_dangerous_deserialization=True
-    )
-    def_ret = db.as_retriever(
-        search_type="mmr",
-        search_kwargs={
-            'k': 3,
-            'lambda_mult': 0.42,
-            'fetch_k': 30
-        }
-    )
-    dbg_ret = db.as_retriever(
-        search_kwargs={
-            'k': 1
-        }
-    )
-
-    memory = MemorySaver()
-    components_descs = get_comps_descs()
-    docs_cache = {}
-except Exception as e:
-    logging.error(f"{e}")
+# one keep-alive pool for every OpenAI call in the process, closed on app shutdown;
+# over HTTP/2 concurrent calls share a connection instead of each opening its own TLS session
+http_client = httpx.AsyncClient(
+    http2=True,
+    limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+    timeout=None
+)
+
+
+class _ExpiringMemorySaver(MemorySaver):
+    # MemorySaver never forgets a thread: drop threads idle for longer than ttl,
+    # and the least recently written ones once there are more than maxsize
+    def __init__(self, ttl: float = THREAD_TTL, maxsize: int = MAX_THREADS):
+        super().__init__()
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._last_write: OrderedDict[str, float] = OrderedDict()
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        now = time.monotonic()
+        thread_id = config["configurable"]["thread_id"]
+        self._last_write[thread_id] = now
+        self._last_write.move_to_end(thread_id)
+        while self._last_write:
+            oldest, written = next(iter(self._last_write.items()))
+            if len(self._last_write) <= self.maxsize and now - written < self.ttl:
+                break
+            del self._last_write[oldest]
+            self.delete_thread(oldest)
+        return super().put(config, checkpoint, metadata, new_versions)
+
+    def delete_thread(self, thread_id: str):
+        self._last_write.pop(thread_id, None)
+        super().delete_thread(thread_id)
+
+
+class _CachedEmbeddings(Embeddings):
+    # the same texts (component lookups, repeated compiler errors) are embedded once and kept on disk
+    def __init__(self, embeddings: Embeddings, cache: diskcache.Cache, model: str):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model = model
+
+    def _key(self, text: str) -> str:
+        return f"{self.model}:{hashlib.sha256(text.encode()).hexdigest()}"
+
+    def _lookup(self, texts: list[str]) -> tuple[list[str], list[list[float] | None]]:
+        keys = [self._key(text) for text in texts]
+        vectors = [self.cache.get(key) for key in keys]
+        return keys, [None if v is None else np.frombuffer(v, dtype=np.float32).tolist() for v in vectors]
+
+    def _store(self, keys: list[str], vectors: list[list[float] | None], misses: list[int], fresh: list[list[float]]):
+        for i, vector in zip(misses, fresh):
+            vectors[i] = vector
+            self.cache.set(keys[i], np.asarray(vector, dtype=np.float32).tobytes())
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys, vectors = self._lookup(texts)
+        misses = [i for i, v in enumerate(vectors) if v is None]
+        if misses:
+            # only the misses go to the API, still as one batch
+            self._store(keys, vectors, misses, self.embeddings.embed_documents([texts[i] for i in misses]))
+        return vectors
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        # the diskcache reads and writes are SQLite queries, keep them off the event loop
+        keys, vectors = await asyncio.to_thread(self._lookup, texts)
+        misses = [i for i, v in enumerate(vectors) if v is None]
+        if misses:
+            fresh = await self.embeddings.aembed_documents([texts[i] for i in misses])
+            await asyncio.to_thread(self._store, keys, vectors, misses, fresh)
+        return vectors
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return (await self.aembed_documents([text]))[0]
+
+
+@dataclass(frozen=True)
+class _Resources:
+    llm: Any
+    embeddings: Any
+    validator: TSXValidator
+    db: Any
+    memory: _ExpiringMemorySaver
+    valid_titles: frozenset[str]
+    funnel_chain: Any
+    funnel_iter_chain: Any
+    coder_chain: Any
+    coder_iter_chain: Any
+    debugger_chain: Any
+    docs_cache: diskcache.Cache
+
+
+def _load_faiss(embeddings: Embeddings):
+    # loaded once in the preloaded master (see warm_up), workers share the pages copy-on-write
+    import faiss
+    from langchain_community.vectorstores import FAISS
+
+    faiss.omp_set_num_threads(FAISS_THREADS)
+    return FAISS.load_local(FAISS_DB_PATH, embeddings, allow_dangerous_deserialization=True)
+
+
+@functools.cache
+def _init() -> _Resources:
+    # built on first use, so importing the module neither loads FAISS nor runs npm install;
+    # a failed attempt is not cached and is retried by the next request
+    from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+
+    logging.info(f"Initializing workflow resources...")
+    try:
+        if not openai_api_key:
+            raise ValueError("OPENAI_API_KEY not found in environment variables")
+        llm = ChatOpenAI(temperature=0.0, api_key=openai_api_key, model="gpt-4o-mini", http_async_client=http_client)
+        openai_embeddings = OpenAIEmbeddings(api_key=openai_api_key, http_async_client=http_client)
+        embeddings = _CachedEmbeddings(
+            openai_embeddings,
+            diskcache.Cache(EMBEDDINGS_CACHE_PATH, size_limit=64 * 1024 * 1024),
+            openai_embeddings.model
+        )
+        if not os.path.isdir(FAISS_DB_PATH):
+            parse_recursivly_store_faiss()
+
+        validator = TSXValidator()
+        db = _load_faiss(embeddings)
+
+        components_descs = get_comps_descs()
+        return _Resources(
+            llm=llm,
+            embeddings=embeddings,
+            validator=validator,
+            db=db,
+            memory=_ExpiringMemorySaver(),
+            valid_titles=frozenset(load_comps_descs()),
+            # the component catalogue never changes at runtime, bind it into the prompts once;
+            # the model answers with a tool call that is validated into the pydantic model, no text to parse
+            funnel_chain=(
+                FUNNEL.partial(components=components_descs)
+                | llm.with_structured_output(FunnelOutput, method="function_calling")
+            ),
+            funnel_iter_chain=(
+                FUNNEL_ITER.partial(components=components_descs)
+                | llm.with_structured_output(FunnelIterOutput, method="function_calling")
+            ),
+            # the prompts take the node's input dict as is
+            coder_chain=CODER | llm | StrOutputParser(),
+            coder_iter_chain=CODER_ITER | llm | StrOutputParser(),
+            debugger_chain=DEBUGGER | llm | StrOutputParser(),
+            # retrieved docs survive process restarts, entries expire so a rebuilt FAISS index is picked up
+            docs_cache=diskcache.Cache(DOCS_CACHE_PATH, size_limit=256 * 1024 * 1024),
+        )
+    except Exception as e:
+        logging.error(f"{e}")
+        raise
 
 
 class Component(BaseModel):
@@ -59,6 +215,10 @@ class Component(BaseModel):
     reason: str = Field(description="для чего использовать на данной странице")
 
 
+# pydantic-core serializes the component list in one call instead of a recursive repr() per model
+_COMPONENTS_ADAPTER = TypeAdapter(list[Component] | None)
+
+
 class FunnelOutput(BaseModel):
     needed_components: list[Component] = Field(
         description="Cписок необходимых компонентов для реализииции запроса пользователя")
@@ -70,168 +230,244 @@ class FunnelIterOutput(BaseModel):
         description="Список компонентов которые требуют модификации в имеющейся реализации")
 
 
-class InterfaceGeneratingState(BaseModel):
-    query: str | None = Field(default=None)
-    components: list[Component] | None = Field(
-        default=None,
-        description="Cписок необходимых компонентов для реализииции запроса пользователя"
-    )
-    code: str | None = Field(default=code_sample, description="Код компонента")
-    errors: str | None | list[Any] = Field(default=None, description="Ошибки вознкшие при генерации кода")
+# plain slotted dataclass: LangGraph rebuilds the state object for every node call, and a pydantic model
+# would revalidate every field (the generated code included) each time; values only come from our own nodes
+@dataclass(slots=True)
+class InterfaceGeneratingState:
+    query: str | None = None
+    # Cписок необходимых компонентов для реализииции запроса пользователя
+    components: list[Component] | None = None
+    # Код компонента
+    code: str | None = code_sample
+    # Ошибки вознкшие при генерации кода
+    errors: str | None | list[Any] = None
+
+    # Новый запрос для изменения текущего интерфейса
+    new_query: str | None = None
+    # Подробная инструкция по тому как улучшить интерфейс
+    instructions: str | None = None
+    # Список компонентов которые требуют модификации в имеющейся реализации
+    components_to_modify: list[Component] | None = None
 
-    new_query: str | None = Field(default=None, description="Новый запрос для изменения текущего интерфейса")
-    instructions: str | None = Field(
-        default=None,
-        description="Подробная инструкция по тому как улучшить интерфейс"
-    )
-    components_to_modify: list[Component] | None = Field(
-        default=None,
-        description="Список компонентов которые требуют модификации в имеющейся реализации"
-    )
+
+_STATE_FIELDS = frozenset(f.name for f in fields(InterfaceGeneratingState))
 
 
 async def funnel(state: InterfaceGeneratingState):
     logging.info(f"Funnel...")
-    if llm is None:
-        state.errors = "LLM not initialized properly"
-        return state
+    resources = _init()
     if state.new_query:
-        iter_funnel_chain = FUNNEL_ITER | llm | PydanticOutputParser(pydantic_object=FunnelIterOutput)
-        res = iter_funnel_chain.invoke(
-            input={
-                "previous_query": state.query,
-                "new_query": state.new_query,
-                "existing_code": state.code,
-                "components": components_descs
-            }
-        )
+        res = await _ainvoke(resources.funnel_iter_chain, {
+            "previous_query": state.query,
+            "new_query": state.new_query,
+            "existing_code": state.code
+        })
 
         state.instructions = res.instructions
         state.components_to_modify = res.components_to_modify
     else:
-        funnel_chain = FUNNEL | llm | PydanticOutputParser(pydantic_object=FunnelOutput)
-        res = funnel_chain.invoke(
-            input={
-                "query": state.query,
-                "components": components_descs
-            }
+        mentioned = resources.valid_titles.intersection(_WORD_RE.findall(state.query))
+        res, _ = await asyncio.gather(
+            _ainvoke(resources.funnel_chain, {
+                "query": state.query
+            }),
+            _warm_docs([_component_query(title) for title in sorted(mentioned)])
         )
 
-        state.components = [cmp for cmp in res.needed_components if f'{cmp.title}:' in components_descs]
-    logging.info(f"Needed components: {state.components}")
+        state.components = [cmp for cmp in res.needed_components if cmp.title in resources.valid_titles]
+    logging.info("Needed components: %s", state.components)
     return state
 
 
-async def search_docs(queries: list[str], is_dbg: bool = False):
-    logging.info(f"Looking for cached queries in {len(docs_cache)}...")
+async def _ainvoke(runnable, inputs: dict):
+    async with _llm_slots:
+        return await runnable.ainvoke(inputs)
+
 
-    def truncate_content(content):
-        sentences = content.splitlines()
-        if len(sentences) > 250:
-            content = '\n'.join(sentences[:250]) + '...'
-        return content
+def _component_query(title: str) -> str:
+    return f"Detailed argsTypes, index and props of a component {title} can have and CODE examples of using {title}"
 
-    retriever = (def_ret, dbg_ret)[is_dbg]
+
+def _component_queries(components: list[Component]) -> list[str]:
+    # the same component may be suggested twice, look it up once
+    return list(dict.fromkeys(_component_query(x.title) for x in components))
+
+
+def _modify_queries(components: list[Component]) -> list[str]:
+    # the same component may be suggested twice, look it up once
+    return list(dict.fromkeys(
+        f"Detailed ARG TYPES of props a component {x.title} can have and CODE examples of using {x.title}"
+        for x in components
+    ))
+
+
+async def _warm_docs(queries: list[str]):
+    # speculative, search_docs leaves the results in docs_cache; a failure only costs the head start
+    if not queries:
+        return
+    try:
+        await search_docs(queries)
+    except Exception as e:
+        logging.error(f"Speculative docs prefetch failed: {str(e)}")
+
+
+def _mmr(query: np.ndarray, pool: np.ndarray, k: int, lambda_mult: float) -> list[int]:
+    # greedy selection of langchain's maximal_marginal_relevance, but every cosine similarity
+    # is computed up front with two matrix products instead of once per selection step
+    norms = np.linalg.norm(pool, axis=1)
+    norms[norms == 0] = 1
+    pool = pool / norms[:, None]
+    to_query = pool @ (query / (np.linalg.norm(query) or 1))
+    pairwise = pool @ pool.T
+
+    selected = [int(np.argmax(to_query))]
+    while len(selected) < min(k, len(pool)):
+        scores = lambda_mult * to_query - (1 - lambda_mult) * pairwise[:, selected].max(axis=1)
+        scores[selected] = -np.inf
+        selected.append(int(np.argmax(scores)))
+    return selected
+
+
+def _batch_search(db, vectors: list[list[float]], is_dbg: bool) -> list[list[Document]]:
+    # one FAISS search over all query vectors, then the same MMR selection
+    # FAISS.max_marginal_relevance_search_by_vector would do for each of them
+    _, indices = db.index.search(np.array(vectors, dtype=np.float32), 1 if is_dbg else MMR_FETCH_K)
+    results = []
+    for vector, row in zip(vectors, indices):
+        ids = [int(i) for i in row if i != -1]
+        if not is_dbg and ids:
+            selected = _mmr(
+                np.array(vector, dtype=np.float32),
+                db.index.reconstruct_batch(np.array(ids, dtype=np.int64)),
+                k=MMR_K,
+                lambda_mult=MMR_LAMBDA
+            )
+            ids = [ids[i] for i in selected]
+        results.append([db.docstore.search(db.index_to_docstore_id[i]) for i in ids])
+    return results
+
+
+def _truncate_content(doc: Document) -> Document:
+    # FAISS hands out the docstore's own Document objects, so never mutate them in place
+    sentences = doc.page_content.splitlines()
+    if len(sentences) <= 250:
+        return doc
+    return Document(page_content='\n'.join(sentences[:250]) + '...', metadata=doc.metadata)
+
+
+def _load_cached_docs(docs_cache: diskcache.Cache, queries: list[str]) -> dict[str, list[Document]]:
+    # SQLite reads and unpickling, run in a worker thread
+    found = {}
+    for q in queries:
+        cached = docs_cache.get(q)
+        if cached is not None:
+            found[q] = cached
+    return found
+
+
+def _search_and_store(resources: _Resources, queries: list[str], vectors: list[list[float]], is_dbg: bool):
+    # the docs_cache writes share the FAISS search's thread hop: under gunicorn every worker writes
+    # the same SQLite file, and waiting on its lock must not block the event loop
+    results = [[_truncate_content(doc) for doc in result] for result in _batch_search(resources.db, vectors, is_dbg)]
+    for q, result in zip(queries, results):
+        resources.docs_cache.set(q, result, expire=DOCS_CACHE_TTL)
+    return results
+
+
+# in-process layer over docs_cache, results are lists of Documents that are never mutated
+_hot_docs = TTLCache(maxsize=256, ttl=DOCS_CACHE_TTL)
+
+
+async def search_docs(queries: Iterable[str], is_dbg: bool = False):
+    resources = _init()
+    docs_cache = resources.docs_cache
+    if logging.root.isEnabledFor(logging.DEBUG):
+        # len() of a diskcache is a query of its own
+        logging.debug("Looking for cached queries in %d...", len(docs_cache))
+
+    queries = list(queries)
+    # the debug loop asks for the same docs on every iteration, serve them from memory before touching disk
+    found = {q: _hot_docs[q] for q in queries if q in _hot_docs}
+    cold = [q for q in queries if q not in found]
+    if cold:
+        from_disk = await asyncio.to_thread(_load_cached_docs, docs_cache, cold)
+        _hot_docs.update(from_disk)
+        found.update(from_disk)
 
     dbg = {}
     qrs, docs = [], []
-    queries = set(queries)
     for q in queries:
-        if q in docs_cache:
-            docs.append(docs_cache[q])
-            dbg[q] = docs_cache[q]
+        cached = found.get(q)
+        if cached is not None:
+            docs += cached
+            dbg[q] = cached
         else:
             qrs.append(q)
-    logging.info(f"Retrieving {len(qrs)} queries...")
+    logging.info("Retrieving %d queries...", len(qrs))
     if qrs:
-        tasks = [retriever.ainvoke(query) for query in qrs]
-        results = await asyncio.gather(*tasks)
+        # one embeddings request and one FAISS search for all queries, off the event loop
+        vectors = await resources.embeddings.aembed_documents(qrs)
+        results = await asyncio.to_thread(_search_and_store, resources, qrs, vectors, is_dbg)
 
-        for i, result in enumerate(results):
-            for doc in result:
-                doc.page_content = truncate_content(doc.page_content)
+        for q, result in zip(qrs, results):
             docs += result
-            docs_cache[qrs[i]] = result
-            dbg[qrs[i]] = result
+            _hot_docs[q] = result
+            dbg[q] = result
 
-    logging.info(f"{len(docs)} docs collected.")
-    logging.info(dbg)
-    logging.info('*' * 50)
+    logging.info("%d docs collected.", len(docs))
+    logging.debug("Docs by query: %s", dbg)
     return docs
 
 
 async def write_code(state: InterfaceGeneratingState):
     logging.info(f"Writer...")
-    interface_coder_chain = (
-            {
-                "interface_components": lambda x: x["interface_components"],
-                "query": lambda x: x["query"],
-                "code_sample": lambda x: x["code_sample"]
-            }
-            | CODER
-            | llm
-            | StrOutputParser()
-    )
-    interface_coder_iter_chain = (
-            {
-                "interface_components": lambda x: x["interface_components"],
-                "query": lambda x: x["query"],
-                "new_query": lambda x: x["new_query"],
-                "instructions": lambda x: x["instructions"],
-                "existing_code": lambda x: x["existing_code"]
-            }
-            | CODER_ITER
-            | llm
-            | StrOutputParser()
-    )
+    resources = _init()
 
     if state.new_query:
-        interface_code = interface_coder_iter_chain.invoke({
+        interface_code = await _ainvoke(resources.coder_iter_chain, {
             "query": state.query,
             "new_query": state.new_query,
             "existing_code": state.code,
             "instructions": state.instructions,
-            "interface_components": await search_docs(
-                [f"Detailed ARG TYPES of props a component {x.title} can have and CODE examples of using {x.title}"
-                 for x in state.components_to_modify]
-            )
+            "interface_components": await search_docs(_modify_queries(state.components_to_modify))
         })
     else:
-        interface_code = interface_coder_chain.invoke({
-            "query": state.query + str(state.components),
+        interface_code = await _ainvoke(resources.coder_chain, {
+            "query": state.query + _COMPONENTS_ADAPTER.dump_json(state.components).decode(),
             "code_sample": state.code,
-            "interface_components": await search_docs(
-                [f"Detailed argsTypes, index and props of a component {x.title} can have and CODE examples of using {x.title}"
-                 for x in state.components]
-            )
+            "interface_components": await search_docs(_component_queries(state.components))
         })
 
     state.code = interface_code
-    logging.info(f"Written code: {state.code}")
+    logging.debug("Written code: %s", state.code)
     return state
 
 
 async def debug_docs(code: str, errors_list: list[Dict[str, Any]]) -> tuple[str, list[Any] | str]:
     logging.info(f"Making queries for fixing...")
-    queries = []
+    queries: set[str] = set()
     code_lines = code.splitlines()
-    pattern = r'\W([A-Z]{2}[a-z]+)'
+    # error comments per line, merged into the code in a single pass below
+    annotations: dict[int, str] = defaultdict(str)
+    trailing = []
 
     for error in errors_list:
         line_num = error['location'][0] - 1
         error_message = f"//ERROR {error['code']}: {error['message']}"
-        matches = set(re.findall(pattern, error['message']))
+        matches = set(_CAMEL_RE.findall(error['message']))
         if matches:
-            queries += matches
+            queries |= matches
         elif len(queries) < 3:
-            queries.append(f'useful code samples to fix {error['message']}')
+            queries.add(f'useful code samples to fix {error['message']}')
         if line_num < len(code_lines):
-            code_lines[line_num] = code_lines[line_num] + error_message
+            annotations[line_num] += error_message
         else:
-            code_lines.append(error_message)
+            trailing.append(error_message)
 
-    annotated_code = f"code with error messages :\n" + "\n".join(code_lines)
-    logging.info(f"{queries}")
+    annotated_code = "code with error messages :\n" + "\n".join(
+        [line + annotations[i] if i in annotations else line for i, line in enumerate(code_lines)] + trailing
+    )
+    logging.debug("Fix queries: %s", queries)
     docs = await search_docs(queries, True) if queries else "No special information needed to fix these errors"
 
     return annotated_code, docs
@@ -239,35 +475,29 @@ async def debug_docs(code: str, errors_list: list[Dict[str, Any]]) -> tuple[str,
 
 async def revise_code(state: InterfaceGeneratingState):
     logging.info(f"Reviser...")
-    interface_debugger_chain = (
-            {
-                "useful_info": lambda x: x["useful_info"],  # Передаём найденные доки по ошибкам
-                "interface_code": lambda x: x["interface_code"]
-            }
-            | DEBUGGER
-            | llm
-            | StrOutputParser()
-    )
     code, docs = await debug_docs(state.code, state.errors)
     logging.info(f"rewriting code...")
-    logging.info(code)
+    logging.debug("%s", code)
 
-    fixed_code = interface_debugger_chain.invoke(
+    fixed_code = await _ainvoke(
+        _init().debugger_chain,
         {
             "interface_code": code,
-            "useful_info": docs
+            "useful_info": docs  # Передаём найденные доки по ошибкам
         }
     )
 
     state.code = fixed_code
-    logging.info(f"Revised code: {state.code}")
+    logging.debug("Revised code: %s", state.code)
     return state
 
 
 async def compile_code(state: InterfaceGeneratingState):
     logging.info(f"compile node...")
-    state.code = re.sub(r"```(jsx|tsx)\s*|\s*```", "", state.code)
-    validation_result = validator.validate_tsx(state.code.strip())
+    state.code = _FENCE_RE.sub("", state.code)
+    validation_result = await asyncio.get_running_loop().run_in_executor(
+        _tsc_pool, _init().validator.validate_tsx, state.code.strip()
+    )
 
     if validation_result["valid"]:
         state.errors = ""
@@ -280,60 +510,110 @@ async def compile_code(state: InterfaceGeneratingState):
 
 
 async def compile_interface(state: InterfaceGeneratingState):
-    compiling_res = state.errors
-    if not compiling_res:
-        return END
-    else:
-        return "debug"
+    # compile_code leaves parsed errors (or "") on the state, no need to scan compiler output here
+    return "debug" if state.errors else END
+
+
+# nodes whose LLM output is the interface code itself, the funnel only emits structured tool calls
+_CODE_NODES = frozenset({"coder", "debug"})
+
+
+def _make_config(thread_id: str = "42") -> dict:
+    # Set up configuration with retry mechanism
+    return {
+        "configurable": {"thread_id": thread_id},
+        "recursion_limit": 50,  # Increase the number of retries further
+    }
+
+
+def _run_config() -> dict:
+    # every run starts from the shared thread's state but checkpoints to a thread of its own,
+    # concurrent runs on one thread_id would interleave their checkpoints
+    return _make_config(f"run-{uuid.uuid4().hex}")
+
+
+async def _save_result(graph, final: dict):
+    # the finished run becomes the shared thread's state, so the next request continues from its code;
+    # a failed write only loses that continuation, the result itself is still returned
+    try:
+        await graph.aupdate_state(_make_config(), final, as_node="compiler")
+    except Exception as e:
+        logging.error(f"Saving the result to the shared thread failed: {str(e)}")
+
+
+def _forget_run(run_config: dict):
+    _init().memory.delete_thread(run_config["configurable"]["thread_id"])
+
+
+def state_version() -> str:
+    # id of the shared thread's latest checkpoint, "" before the first run;
+    # runs that start at the same version start from the same state
+    checkpoint = _init().memory.get_tuple(_make_config())
+    return checkpoint[1]["id"] if checkpoint else ""
+
+
+def _initial_state(query: str, config: dict) -> InterfaceGeneratingState:
+    checkpoint = _init().memory.get_tuple(config)
+    cur_state = None
+    if checkpoint:
+        cur_dict: dict = checkpoint[1]["channel_values"]
+        # channel_values also holds LangGraph's internal channels
+        cur_state = InterfaceGeneratingState(**{k: v for k, v in cur_dict.items() if k in _STATE_FIELDS})
+
+        # add new button for iterative process
+        # cur_state.new_query = query
+        cur_state.query = query
+    if not cur_state:
+        cur_state = InterfaceGeneratingState(query=query)
+    return cur_state
+
+
+@functools.cache
+def _graph():
+    # compiled once and shared by all requests, the checkpointer keeps the per-thread state
+    from langgraph.graph import StateGraph
+
+    builder = StateGraph(InterfaceGeneratingState)
+    builder.add_node("funnel", funnel)
+    builder.add_node("coder", write_code)
+    builder.add_node("compiler", compile_code)
+    builder.add_node("debug", revise_code)
+
+    builder.set_entry_point("funnel")
+    builder.add_edge("funnel", "coder")
+    builder.add_edge("coder", "compiler")
+    builder.add_conditional_edges(
+        'compiler',
+        compile_interface
+    )
+    builder.add_edge("debug", "compiler")
+    return builder.compile(checkpointer=_init().memory)
+
+
+def warm_up():
+    # loads FAISS, runs the validator setup and compiles the graph ahead of the first request;
+    # blocking, call it before serving or from a worker thread
+    _init()
+    _graph()
 
 
 async def generate(query: str) -> str:
     logging.info(f"generate func started")
 
     try:
-        # Set up configuration with retry mechanism
-        config = {
-            "configurable": {"thread_id": "42"},
-            "recursion_limit": 50,  # Increase the number of retries further
-        }
-        cur_state = None
-        if memory.get_tuple(config):
-            cur_dict: dict = memory.get_tuple(config)[1]["channel_values"]
-            cur_state = InterfaceGeneratingState(**cur_dict)
-
-            # add new button for iterative process
-            # cur_state.new_query = query
-            cur_state.query = query
-        if not cur_state:
-            cur_state = InterfaceGeneratingState(query=query)
-
-        builder = StateGraph(InterfaceGeneratingState)
-        builder.add_node("funnel", funnel)
-        builder.add_node("coder", write_code)
-        builder.add_node("compiler", compile_code)
-        builder.add_node("debug", revise_code)
-
-        builder.set_entry_point("funnel")
-        builder.add_edge("funnel", "coder")
-        builder.add_edge("coder", "compiler")
-        builder.add_conditional_edges(
-            'compiler',
-            compile_interface
-        )
-        builder.add_edge("debug", "compiler")
-        graph = builder.compile(checkpointer=memory)
+        cur_state = _initial_state(query, _make_config())
+        run_config = _run_config()
+        graph = _graph()
 
         try:
             logging.info(f"graph invoking...")
-            state = await graph.ainvoke(cur_state, config)
+            try:
+                state = await graph.ainvoke(cur_state, run_config)
+            finally:
+                _forget_run(run_config)
+            await _save_result(graph, state)
             logging.info("Generation process completed successfully.")
-            if isinstance(state, dict):
-                logging.info(f"Final state errors: {state.get('errors', 'No errors')}")
-                logging.info(f"Final state code length: {len(state.get('code', ''))}")
-                return str(state.get('code', 'No code generated'))
-            else:
-                logging.error(f"Unexpected state type: {type(state)}")
-                return "An error occurred: Unexpected state type"
+            return _final_code(state)
         except EnvironmentError as e:
             logging.error(f"Environment setup error: {str(e)}")
             return f"An error occurred during environment setup: {str(e)}"
@@ -345,6 +625,76 @@ async def generate(query: str) -> str:
         return f"An error occurred during generation: {str(e)}"
 
 
+async def generate_batch(queries: list[str]) -> list[str]:
+    logging.info(f"generate_batch func started for {len(queries)} queries")
+
+    try:
+        config = _make_config()
+        graph = _graph()
+        # read before the first await, so the runs start at the state_version() the caller saw just before
+        states = [_initial_state(query, config) for query in queries]
+        configs = [_run_config() for _ in queries]
+
+        logging.info(f"graph batch invoking...")
+        try:
+            results = await graph.abatch(states, configs, return_exceptions=True)
+        finally:
+            for run_config in configs:
+                _forget_run(run_config)
+        # the runs of a batch are concurrent, the last request's result is the one the next request continues
+        finished = [state for state in results if not isinstance(state, Exception)]
+        if finished:
+            await _save_result(graph, finished[-1])
+    except Exception as e:
+        logging.error(f"Error in generate_batch function: {str(e)}")
+        return [f"An error occurred during generation: {str(e)}"] * len(queries)
+
+    codes = []
+    for state in results:
+        if isinstance(state, Exception):
+            logging.error(f"Error in generate_batch function: {str(state)}")
+            codes.append(f"An error occurred during generation: {str(state)}")
+        else:
+            codes.append(_final_code(state))
+    return codes
+
+
+def _final_code(state) -> str:
+    if isinstance(state, dict):
+        logging.info("Final state errors: %s", state.get('errors', 'No errors'))
+        logging.info("Final state code length: %d", len(state.get('code', '')))
+        return str(state.get('code', 'No code generated'))
+    else:
+        logging.error(f"Unexpected state type: {type(state)}")
+        return "An error occurred: Unexpected state type"
+
+
+async def stream_generate(query: str) -> AsyncIterator[Dict[str, Any]]:
+    # yields code tokens of the writer/reviser while the model produces them,
+    # and the code of every graph step as soon as the step finishes
+    logging.info(f"stream_generate func started")
+    run_config = _run_config()
+    graph = _graph()
+
+    try:
+        async for mode, chunk in graph.astream(
+            _initial_state(query, _make_config()), run_config, stream_mode=["messages", "updates"]
+        ):
+            if mode == "messages":
+                message, metadata = chunk
+                node = metadata.get("langgraph_node")
+                if node in _CODE_NODES and message.content:
+                    yield {"node": node, "token": message.content}
+                continue
+            for node, values in chunk.items():
+                values = values or {}
+                yield {"node": node, "code": values.get("code"), "errors": values.get("errors")}
+        # only a run streamed to the end is saved, a disconnected client leaves the shared thread as it was
+        await _save_result(graph, (await graph.aget_state(run_config)).values)
+    finally:
+        _forget_run(run_config)
+
+
 def _add_error_handling(func):
     def wrapper(state: InterfaceGeneratingState):
         try:
@@ -1,12 +1,10 @@
 import csv
+import functools
 import json
 import os
 import re
 import asyncio
 import chardet
-from langchain_community.document_loaders import CSVLoader
-from langchain_community.vectorstores import FAISS
-from langchain_openai import OpenAIEmbeddings
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 COMPONENTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'backend', 'ds-2.0', 'src', 'components')
@@ -194,6 +192,11 @@ def parse_recursivly_store_faiss():
 
     if not os.path.isdir(FAISS_DB_PATH):
         print(f"FAISS database not found at {FAISS_DB_PATH}. Creating new database...")
+        # тяжёлые импорты нужны только при пересборке базы
+        from langchain_community.document_loaders import CSVLoader
+        from langchain_community.vectorstores import FAISS
+        from langchain_openai import OpenAIEmbeddings
+
         loader = CSVLoader(file_path=OUTPUT_CSV_PATH, autodetect_encoding=True)
         documents = loader.load()
         embeddings = OpenAIEmbeddings()
@@ -204,8 +207,22 @@ def parse_recursivly_store_faiss():
         print(f"FAISS database found at {FAISS_DB_PATH}")
 
 
-def get_comps_descs() -> str:
+def compact_description(description: str) -> str:
+    # описания взяты из jsx как есть: снимаем обёртки {`...`} / "..." и лишние пробелы
+    description = description.strip()
+    if description.startswith('{') and description.endswith('}'):
+        description = description[1:-1].strip()
+    return " ".join(description.strip('`"\'').split())
+
+
+@functools.cache
+def load_comps_descs() -> dict[str, str]:
     with open(OUTPUT_JSON_PATH, 'r', encoding="utf=8") as file:
         comps_descs = json.load(file)['descriptions']
 
+    return {k: compact_description(v) for k, v in comps_descs.items()}
+
+
+def get_comps_descs() -> str:
+    comps_descs = load_comps_descs()
     return "\n".join([f'{k}: {v}' for k, v in comps_descs.items()])
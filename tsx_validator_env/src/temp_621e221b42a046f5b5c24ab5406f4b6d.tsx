@@ -1,22 +0,0 @@
-```tsx
-// Import necessary components
-import React from 'react';
-import { Grid, Card, Typography, Divider, Button } from '@nlmk/ds-2.0';
-
-// Main component structure based on JSON
-const Interface = () => {
-  return (
-    <Grid>
-      <Card>
-        <Typography variant="Heading3">Card Title</Typography>
-        <Divider />
-        <Typography variant="Body1">This is a simple card description.</Typography>
-        <Button>Click Me</Button>
-      </Card>
-    </Grid>
-  );
-};
-
-// Export the main component
-export default Interface;
-```
\ No newline at end of file